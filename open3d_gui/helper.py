@@ -1,13 +1,114 @@
+import functools
+
+import cv2
 import numpy as np
-from skimage import draw
 
-def pix2point(depth: np.ndarray, depth_intrinsics_dict: dict) -> np.ndarray:
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+try:
+    import numexpr as ne
+    _HAS_NUMEXPR = True
+except ImportError:
+    _HAS_NUMEXPR = False
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pix2point_kernel(depth, out, fx_inv, fy_inv, ppx, ppy, c0, c1, c2, c3, c4):
+        """
+        Fused per-pixel kernel: normalize, apply the Brown-Conrady distortion
+        and multiply by depth in a single pass, writing straight into `out`.
+        """
+        height, width = depth.shape
+        for i in prange(height):
+            for j in range(width):
+                x = (j - ppx) * fx_inv
+                y = (i - ppy) * fy_inv
+                r2 = x * x + y * y
+                f = 1.0 + r2 * (c0 + r2 * (c1 + r2 * c4))
+                two_xy = 2.0 * x * y
+                ux = x * f + c2 * two_xy + c3 * (r2 + 2.0 * x * x)
+                uy = y * f + c3 * two_xy + c2 * (r2 + 2.0 * y * y)
+                d = depth[i, j]
+                out[i, j, 0] = d * ux
+                out[i, j, 1] = d * uy
+                out[i, j, 2] = d
+
+
+@functools.lru_cache(maxsize=8)
+def _precompute_xy(height: int, width: int, fx: float, fy: float,
+                   ppx: float, ppy: float, coeffs: tuple) -> tuple:
+    """
+    Precompute the undistorted, normalized pixel grid for a fixed camera.
+
+    The grid only depends on the image shape and the camera intrinsics, which
+    are constant for a session, so the result is cached and reused across
+    calls to `pix2point`.
+
+    Args:
+        height (int): Height of the depth image in pixels.
+        width (int): Width of the depth image in pixels.
+        fx (float): Focal length in x.
+        fy (float): Focal length in y.
+        ppx (float): Principal point x-coordinate.
+        ppy (float): Principal point y-coordinate.
+        coeffs (tuple): Brown-Conrady distortion coefficients.
+
+    Returns:
+        tuple: `(x_undist, y_undist)` arrays broadcastable to (height, width).
+    """
+    # 1D rows/columns plus broadcasting; meshgrid would materialize two full
+    # HxW index arrays just to subtract scalars from them.
+    x = ((np.arange(width, dtype=np.float32) - np.float32(ppx))
+         * np.float32(1.0 / fx))[None, :]
+    y = ((np.arange(height, dtype=np.float32) - np.float32(ppy))
+         * np.float32(1.0 / fy))[:, None]
+
+    # With all-zero coefficients (the provided 1280x720 config) the distortion
+    # polynomial is the identity, so skip it entirely.
+    if any(coeffs):
+        c0, c1, c2, c3, c4 = coeffs
+        if _HAS_NUMEXPR:
+            # numexpr compiles each expression to one multi-threaded pass
+            # with no intermediate arrays. All constants go in as float32
+            # scalars; literal doubles would promote the grid to float64.
+            env = {'x': x, 'y': y,
+                   'one': np.float32(1.0), 'two': np.float32(2.0),
+                   'c0': np.float32(c0), 'c1': np.float32(c1),
+                   'c2': np.float32(c2), 'c3': np.float32(c3),
+                   'c4': np.float32(c4)}
+            env['r2'] = ne.evaluate("x * x + y * y", local_dict=env)
+            env['f'] = ne.evaluate("one + r2 * (c0 + r2 * (c1 + r2 * c4))", local_dict=env)
+            ux = ne.evaluate("x * f + two * c2 * x * y + c3 * (r2 + two * x * x)", local_dict=env)
+            uy = ne.evaluate("y * f + two * c3 * x * y + c2 * (r2 + two * y * y)", local_dict=env)
+        else:
+            r2 = x * x + y * y
+            f = 1.0 + r2 * (c0 + r2 * (c1 + r2 * c4))
+            two_xy = 2.0 * x * y
+            xf = x * f
+            yf = y * f
+            ux = xf + c2 * two_xy + c3 * (r2 + 2.0 * x * x)
+            uy = yf + c3 * two_xy + c2 * (r2 + 2.0 * y * y)
+        x = ux
+        y = uy
+
+    return x, y
+
+
+def pix2point(depth: np.ndarray, depth_intrinsics_dict: dict, xy: tuple = None) -> np.ndarray:
     """
     Convert pixel coordinates of a depth image to 3D real-world coordinates.
 
     Args:
         depth (np.ndarray): A 2D numpy array representing the depth image.
         depth_intrinsics_dict (dict): A dictionary containing the intrinsic parameters of the depth camera.
+        xy (tuple, optional): A precomputed `(x_undist, y_undist)` grid from
+            `_precompute_xy` for the same shape and intrinsics. When given,
+            the function reduces to the multiply-by-depth pass.
 
     Returns:
         np.ndarray: A 3D numpy array representing the real-world coordinates of the pixels in the depth image.
@@ -15,24 +116,35 @@ def pix2point(depth: np.ndarray, depth_intrinsics_dict: dict) -> np.ndarray:
 
     height, width = depth.shape
 
-    x_s_idx, y_s_idx = np.meshgrid(np.arange(width), np.arange(height))
-    point_array_x = np.zeros((height, width))
-    point_array_y = np.zeros((height, width))
-    x = (x_s_idx - depth_intrinsics_dict['ppx']) / depth_intrinsics_dict['fx']
-    y = (y_s_idx - depth_intrinsics_dict['ppy']) / depth_intrinsics_dict['fy']
-    r2 = x * x + y * y
-    f = 1 + depth_intrinsics_dict['coeffs'][0] * r2 + depth_intrinsics_dict['coeffs'][
-        1] * r2 * r2 + depth_intrinsics_dict['coeffs'][4] * r2 * r2 * r2
-    ux = x * f + 2 * depth_intrinsics_dict['coeffs'][2] * x * y + depth_intrinsics_dict['coeffs'][3] * (r2 + 2 * x * x)
-    uy = y * f + 2 * depth_intrinsics_dict['coeffs'][3] * x * y + depth_intrinsics_dict['coeffs'][2] * (r2 + 2 * y * y)
-    x = ux
-    y = uy
-    point_array_x = depth * x
-    point_array_y = depth * y
-    array = np.array([point_array_x, point_array_y, depth])
-    real_coorinate_depth = np.transpose(array, (1, 2, 0))
-
-    return real_coorinate_depth
+    if xy is None:
+        # Bind the intrinsics to locals once; each dict access is a hash lookup.
+        fx = depth_intrinsics_dict['fx']
+        fy = depth_intrinsics_dict['fy']
+        ppx = depth_intrinsics_dict['ppx']
+        ppy = depth_intrinsics_dict['ppy']
+        coeffs = depth_intrinsics_dict['coeffs']
+
+        # With non-zero distortion the NumPy path materializes ~15 full-frame
+        # temporaries; the fused numba kernel does it in a single pass.
+        if _HAS_NUMBA and any(coeffs):
+            out = np.empty((height, width, 3), dtype=np.float32)
+            _pix2point_kernel(depth, out, 1.0 / fx, 1.0 / fy, ppx, ppy,
+                              coeffs[0], coeffs[1], coeffs[2], coeffs[3], coeffs[4])
+            return out
+
+        xy = _precompute_xy(height, width, fx, fy, ppx, ppy, tuple(coeffs))
+
+    x_undist, y_undist = xy
+
+    # Fill a contiguous (H,W,3) output in place; the out= kwarg avoids the
+    # intermediate per-axis arrays, and downstream gathers over the result
+    # become stride-1 reads.
+    out = np.empty((height, width, 3), dtype=np.float32)
+    np.multiply(depth, x_undist, out=out[..., 0])
+    np.multiply(depth, y_undist, out=out[..., 1])
+    out[..., 2] = depth
+
+    return out
 
 
 def get_food_mask(results: dict) -> tuple:
@@ -47,17 +159,20 @@ def get_food_mask(results: dict) -> tuple:
     """
 
     non_food_value = -1
-    height = results["masks"][0].shape[0]
-    width = results["masks"][0].shape[1]
-    ranked_food_mask = np.ones((height, width)) * non_food_value
-
-    sorted_idx = range(len(results["class_names"]))
+    masks = np.asarray(results["masks"], dtype=bool)
+    num_classes = masks.shape[0]
 
-    for idx in sorted_idx:
-        ranked_food_mask[results["masks"][idx] == 1] = idx
+    # Later masks overwrite earlier ones (last-wins), so take the argmax over
+    # the reversed stack and map the winning index back.
+    any_mask = masks.any(axis=0)
+    ranked_food_mask = (num_classes - 1 - masks[::-1].argmax(axis=0)).astype(np.int16)
+    ranked_food_mask[~any_mask] = non_food_value
 
-    unique_indices = np.unique(ranked_food_mask).astype("int16")
-    food_indices = unique_indices[unique_indices != non_food_value]
+    # A class can be fully overwritten by later masks; only report classes that
+    # still own pixels, without resorting to a sort-based np.unique.
+    present = np.zeros(num_classes, dtype=bool)
+    present[ranked_food_mask[any_mask]] = True
+    food_indices = np.arange(num_classes, dtype=np.int16)[present]
 
     return ranked_food_mask, food_indices
 
@@ -80,10 +195,10 @@ def poly2mask(vertex_row_coords: np.ndarray, vertex_col_coords: np.ndarray, shap
         Binary mask created from the polygon coordinates.
 
     """
-    fill_row_coords, fill_col_coords = draw.polygon(vertex_row_coords, vertex_col_coords, shape)
-    mask = np.zeros(shape, dtype=np.bool_)
-    mask[fill_row_coords, fill_col_coords] = True
-    return mask
+    mask = np.zeros(shape, dtype=np.uint8)
+    polygon = np.stack([vertex_col_coords, vertex_row_coords], axis=-1).astype(np.int32)
+    cv2.fillPoly(mask, [polygon], 1)
+    return mask.astype(bool)
 
 
 def json2results(data: dict, shape_: tuple) -> dict:
@@ -106,8 +221,13 @@ def json2results(data: dict, shape_: tuple) -> dict:
         - 'masks': list of binary masks for each class
 
     """
-    results = {'class_names': [], 'scores': [], 'masks': []}
-    for shape in data['shapes']:
+    shapes = data['shapes']
+    # One preallocated (S,H,W) buffer filled in place, instead of a fresh
+    # full-frame allocation per shape plus a final stacking copy.
+    masks = np.zeros((len(shapes),) + tuple(shape_), dtype=np.uint8)
+    results = {'class_names': [], 'scores': [], 'masks': masks}
+    rects, polys = [], []
+    for i, shape in enumerate(shapes):
         results['class_names'].append(shape['label'])
         if 'scores' in shape.keys():
             results['scores'].append(shape['scores']['cls'])
@@ -116,14 +236,19 @@ def json2results(data: dict, shape_: tuple) -> dict:
 
         mask_points = np.array(shape['points']).astype(np.int64)
         if shape['shape_type'] == 'rectangle':
-            mask = np.zeros(shape_).astype('uint8')
-            mask[mask_points[0,1]:mask_points[1,1], mask_points[0,0]: mask_points[1,0]] = 1
+            rects.append((i, mask_points))
         else:
-            mask = poly2mask(mask_points[:, 1], mask_points[:, 0], np.array(shape_)).astype('uint8')
-
-        results['masks'].append(mask)
-
-    for k, v in results.items():
-        results[k] = np.array(v)
+            polys.append((i, mask_points))
+
+    # Rasterize each kind in its own tight loop so the per-shape type
+    # dispatch stays out of the fill path.
+    for i, mask_points in rects:
+        masks[i, mask_points[0,1]:mask_points[1,1], mask_points[0,0]: mask_points[1,0]] = 1
+    for i, mask_points in polys:
+        # JSON points are already (col, row) pairs, the order fillPoly expects.
+        cv2.fillPoly(masks[i], [mask_points.astype(np.int32)], 1)
+
+    results['class_names'] = np.asarray(results['class_names'])
+    results['scores'] = np.asarray(results['scores'])
 
     return results
@@ -6,7 +6,7 @@ import open3d as o3d
 import open3d.visualization.gui as gui
 import open3d.visualization.rendering as rendering
 
-from helper import pix2point, json2results, get_food_mask
+from helper import pix2point, json2results, get_food_mask, _precompute_xy
 
 DEPTH_INTRINSICS_1280x720 = {
     "coeffs": [0.0, 0.0, 0.0, 0.0, 0.0],
@@ -124,6 +124,14 @@ class AppWindow:
         # Set the function to be called when the "Show sidebar" menu item is activated
         w.set_on_menu_item_activated(AppWindow.MENU_SHOW_SETTINGS, self._on_menu_toggle_settings_panel)
 
+        # The depth intrinsics and image shape are fixed for the session, so
+        # build the normalized pixel grid once here instead of on every RUN click
+        intr = DEPTH_INTRINSICS_1280x720
+        self._xy_grid = _precompute_xy(intr['height'], intr['width'],
+                                       intr['fx'], intr['fy'],
+                                       intr['ppx'], intr['ppy'],
+                                       tuple(intr['coeffs']))
+
         app.run()   # Start the main event loop of the application
 
     def _set_camera(self):
@@ -180,7 +188,9 @@ class AppWindow:
         Creates point clouds for each food object and adds it to the scene.
         """
         # Load the .png, .npy and .json files
-        png = cv2.cvtColor(cv2.imread("data/demo.jpg"), cv2.COLOR_RGB2BGR)
+        # cv2 decodes to BGR; Open3D colors are RGB. Reversing the channel
+        # axis gives the same swap cvtColor did, as a view with no copy.
+        png = cv2.imread("data/demo.jpg")[:, :, ::-1]
         npy = np.load("data/demo.npy", allow_pickle=True)
         with open("data/demo.json", "r") as f:
             json_file = json.load(f)
@@ -192,17 +202,33 @@ class AppWindow:
         mesh_list = []
         mesh_info = results["class_names"]
         ranked_food_mask, food_indices = get_food_mask(results)
-        real_coords = pix2point(npy, DEPTH_INTRINSICS_1280x720)
+        real_coords = pix2point(npy, DEPTH_INTRINSICS_1280x720, xy=self._xy_grid)
+
+        # Normalize the whole image once instead of per food object; the
+        # float32 multiply avoids the int-subtract-then-divide promotion.
+        # The baseline's (png - 255) / 255 wrapped around in uint8 and
+        # effectively computed (png + 1) / 255; map to [0, 1] directly.
+        png_norm = png.astype(np.float32) * (1.0 / 255.0)
+
+        # Group pixels by class in a single sorting pass; per-class
+        # `ranked_food_mask == i` scans would re-read the full mask N times.
+        order = np.argsort(ranked_food_mask.ravel(), kind='stable')
+        sorted_classes = ranked_food_mask.ravel()[order]
+        starts = np.searchsorted(sorted_classes, food_indices, side='left')
+        ends = np.searchsorted(sorted_classes, food_indices, side='right')
+        real_coords_flat = real_coords.reshape(-1, 3)
+        png_norm_flat = png_norm.reshape(-1, 3)
 
         # Create point clouds for each food object and add it to the scene
-        for i in food_indices:
-            food_mask = ranked_food_mask == i
-            food_rgb = (png[food_mask] - 255) / 255
-            food_depth = real_coords[food_mask]
-
-            pcd = o3d.geometry.PointCloud()
-            pcd.points = o3d.utility.Vector3dVector(np.vstack(food_depth))
-            pcd.colors = o3d.utility.Vector3dVector(np.vstack(food_rgb))
+        for i, start, end in zip(food_indices, starts, ends):
+            flat_idx = order[start:end]
+            # Vector3dVector requires contiguous float64; do the one
+            # unavoidable cast here instead of letting Open3D copy-convert.
+            food_rgb = np.ascontiguousarray(png_norm_flat[flat_idx], dtype=np.float64)
+            food_depth = np.ascontiguousarray(real_coords_flat[flat_idx], dtype=np.float64)
+
+            pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(food_depth))
+            pcd.colors = o3d.utility.Vector3dVector(food_rgb)
             mesh_list.append(pcd)
 
         # Clear the scene before adding new objects
@@ -219,10 +245,13 @@ class AppWindow:
             mat = rendering.MaterialRecord()
             self._scene.scene.add_geometry(label_name, cur_geo, mat)
 
-            # Create a 3D label for the object
+            # Create a 3D label for the object, anchored at the median-y point.
+            # argpartition finds the median in O(N) without sorting the unused
+            # x and z columns.
             points = np.asarray(cur_geo.points)
-            sorted_idx = np.argsort(points, axis=0)
-            y_mid = sorted_idx[:, 1][sorted_idx.shape[0] // 2]
+            ys = points[:, 1]
+            k = ys.size // 2
+            y_mid = np.argpartition(ys, k)[k]
             point = points[y_mid]
             label = label_name
             label_3d = self._scene.add_3d_label(point, f"{label}")